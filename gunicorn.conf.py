@@ -0,0 +1,23 @@
+"""
+Configuración de gunicorn para el sistema PHQ-9 clínico
+"""
+
+import os
+
+# Cada petición que espera en el control de admisión ocupa un hilo: el pool debe cubrir
+# la concurrencia máxima, las colas de todas las rutas y algunos hilos libres para
+# responder 503 de inmediato y servir las rutas no controladas (formulario, salud).
+# Los valores por defecto coinciden con ADMISSION_* en phq9_backend.py
+worker_class = 'gthread'
+threads = (
+    int(os.environ.get('ADMISSION_MAX_CONCURRENT', 8))
+    + int(os.environ.get('ADMISSION_SUBMIT_QUEUE', 16))
+    + int(os.environ.get('ADMISSION_ADMIN_QUEUE', 4))
+    + int(os.environ.get('ADMISSION_SPARE_THREADS', 4))
+)
+
+
+def post_worker_init(worker):
+    # Las tareas periódicas solo se inician en los workers, no al importar la aplicación
+    from phq9_backend import start_background_jobs
+    start_background_jobs()
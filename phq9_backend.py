@@ -4,17 +4,44 @@ Backend para Formulario PHQ-9 Clínico
 Sistema de almacenamiento y envío de correos para seguimiento longitudinal
 """
 
-from flask import Flask, request, jsonify, render_template_string
+from flask import Flask, request, jsonify, render_template_string, g, abort, send_from_directory
 from flask_cors import CORS
+import click
 import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 import json
 import os
-from datetime import datetime
+import re
+from datetime import datetime, timedelta
 import sqlite3
+from pathlib import Path
 import hashlib
 import logging
+import shutil
+import struct
+import threading
+import tempfile
+import time
+import mmap
+import heapq
+import itertools
+import cProfile
+import hmac
+import random
+import sys
+from collections import Counter
+from functools import wraps
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin bloqueo entre procesos para el programador
+    fcntl = None
+
+try:
+    import numpy as np
+except ImportError:  # NumPy es opcional: la instantánea analítica también se lee con struct
+    np = None
 
 # Configuración de logging
 logging.basicConfig(level=logging.INFO)
@@ -33,13 +60,88 @@ DOCTOR_EMAIL = "breisonvelarde@gmail.com"
 # Base de datos SQLite
 DB_PATH = "phq9_clinical.db"
 
-def init_database():
-    """Inicializar base de datos SQLite"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS phq9_responses (
+# Archivado (datos fríos): respuestas más antiguas que HOT_RETENTION_DAYS se
+# mueven a un archivo SQLite mensual dentro de ARCHIVE_DIR
+ARCHIVE_DIR = os.environ.get('ARCHIVE_DIR', 'archivo')
+HOT_RETENTION_DAYS = int(os.environ.get('HOT_RETENTION_DAYS', 365))
+ARCHIVE_FILE_PATTERN = re.compile(r'^phq9_archivo_(\d{4})_(\d{2})\.db$')
+
+# Respaldos en línea (sqlite3.Connection.backup por pasos pequeños)
+DB_WAL_MODE = os.environ.get('DB_WAL_MODE', '0') == '1'
+BACKUP_DIR = os.environ.get('BACKUP_DIR', 'respaldos')
+BACKUP_PAGES_PER_STEP = int(os.environ.get('BACKUP_PAGES_PER_STEP', 256))
+BACKUP_STEP_SLEEP = float(os.environ.get('BACKUP_STEP_SLEEP', 0.05))  # segundos entre pasos
+BACKUP_RETENTION = int(os.environ.get('BACKUP_RETENTION', 7))  # respaldos completos a conservar
+BACKUP_INTERVAL_HOURS = float(os.environ.get('BACKUP_INTERVAL_HOURS', 0))  # 0 = programador desactivado
+BACKUP_INCREMENTAL = os.environ.get('BACKUP_INCREMENTAL', '0') == '1'
+BACKUP_FULL_EVERY = int(os.environ.get('BACKUP_FULL_EVERY', 24))  # con incrementales: un completo cada N respaldos
+BACKUP_MAX_RESTARTS = int(os.environ.get('BACKUP_MAX_RESTARTS', 3))  # modo rollback: reinicios antes de copiar en un paso
+
+# Perfilado opcional por petición (sin coste si PROFILING_ENABLED está desactivado)
+PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', '0') == '1'
+PROFILING_SECRET = os.environ.get('PROFILING_SECRET', '')  # cabecera X-Profile-Token
+PROFILING_SAMPLE_RATE = float(os.environ.get('PROFILING_SAMPLE_RATE', 0))  # fracción de peticiones
+PROFILING_MODE = os.environ.get('PROFILING_MODE', 'cprofile')  # 'cprofile' o 'sampling'
+PROFILING_SAMPLE_INTERVAL = float(os.environ.get('PROFILING_SAMPLE_INTERVAL', 0.005))  # segundos
+PROFILING_ENDPOINTS = set(os.environ.get('PROFILING_ENDPOINTS', 'submit_phq9,admin_dashboard').split(','))
+PROFILING_DIR = os.environ.get('PROFILING_DIR', 'perfiles')
+PROFILING_MAX_FILES = int(os.environ.get('PROFILING_MAX_FILES', 50))
+
+# Control de admisión: concurrencia por ruta, cola acotada y rechazo rápido con 503
+# gunicorn.conf.py dimensiona los hilos como concurrencia + colas, ya que una petición en cola ocupa un hilo
+ADMISSION_MAX_CONCURRENT = int(os.environ.get('ADMISSION_MAX_CONCURRENT', 8))
+ADMISSION_RETRY_AFTER = int(os.environ.get('ADMISSION_RETRY_AFTER', 5))  # segundos
+ADMISSION_ROUTES = {
+    # Menor prioridad = se atiende antes; los envíos de pacientes van primero
+    'submit_phq9': {
+        'priority': 0,
+        'limit': int(os.environ.get('ADMISSION_SUBMIT_LIMIT', ADMISSION_MAX_CONCURRENT)),
+        'queue': int(os.environ.get('ADMISSION_SUBMIT_QUEUE', 16)),
+        'timeout': float(os.environ.get('ADMISSION_SUBMIT_TIMEOUT', 5)),
+    },
+    'admin_dashboard': {
+        'priority': 1,
+        'limit': int(os.environ.get('ADMISSION_ADMIN_LIMIT', 2)),
+        'queue': int(os.environ.get('ADMISSION_ADMIN_QUEUE', 4)),
+        'timeout': float(os.environ.get('ADMISSION_ADMIN_TIMEOUT', 1)),
+    },
+}
+
+# Codificación compacta de respuestas: q1..q9 y dificultad (0-3) en 2 bits cada una, 20 bits en total
+PACKED_ANSWERS = os.environ.get('PACKED_ANSWERS', '0') == '1'
+ANSWER_FIELDS = [f'q{i}' for i in range(1, 10)] + ['difficulty']
+PACKED_ANSWERS_SQL = ' | '.join(
+    f'({field} & 3)' if bit == 0 else f'(({field} & 3) << {bit})'
+    for field, bit in zip(ANSWER_FIELDS, range(0, 20, 2))
+)
+
+# Instantánea analítica binaria (registros de ancho fijo, leída con mmap)
+ANALYTICS_SNAPSHOT_PATH = os.environ.get('ANALYTICS_SNAPSHOT_PATH', 'phq9_snapshot.bin')
+ANALYTICS_SNAPSHOT_MINUTES = float(os.environ.get('ANALYTICS_SNAPSHOT_MINUTES', 0))  # 0 = solo con `flask refresh-snapshot`
+ANALYTICS_SNAPSHOT_MAX_AGE_MINUTES = float(os.environ.get('ANALYTICS_SNAPSHOT_MAX_AGE_MINUTES', 60))  # más antigua: no se sirve
+
+# Réplica de lectura: copia de solo lectura para admin y analítica; los envíos usan DB_PATH
+READ_REPLICA_ENABLED = os.environ.get('READ_REPLICA_ENABLED', '0') == '1'
+READ_REPLICA_PATH = os.environ.get('READ_REPLICA_PATH', 'phq9_replica.db')
+READ_REPLICA_REFRESH_SECONDS = float(os.environ.get('READ_REPLICA_REFRESH_SECONDS', 60))
+READ_REPLICA_MAX_STALENESS = float(os.environ.get('READ_REPLICA_MAX_STALENESS', 300))  # segundos
+
+# Latencia de escritura (epoch, milisegundos) y último reporte de respaldo, en archivos de
+# BACKUP_DIR para que los compartan todos los workers y el comando `flask backup`
+WRITE_LATENCY_LOG = os.path.join(BACKUP_DIR, 'latencias_escritura.log')
+WRITE_LATENCY_LOG_MAX_BYTES = 256 * 1024
+LAST_BACKUP_REPORT_PATH = os.path.join(BACKUP_DIR, 'ultimo_respaldo.json')
+BACKUP_IN_PROGRESS_PATH = os.path.join(BACKUP_DIR, 'respaldo_en_curso')
+
+RESPONSE_COLUMNS = (
+    "id, patient_email, timestamp, measurement_number, "
+    "q1, q2, q3, q4, q5, q6, q7, q8, q9, difficulty, total_score, created_at"
+)
+
+def create_responses_table(cursor, schema='main'):
+    """Crear la tabla phq9_responses en el esquema indicado (principal o archivo)"""
+    cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS {schema}.phq9_responses (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             patient_email TEXT NOT NULL,
             timestamp TEXT NOT NULL,
@@ -58,6 +160,62 @@ def init_database():
             created_at TEXT DEFAULT CURRENT_TIMESTAMP
         )
     ''')
+    cursor.execute(
+        f"CREATE INDEX IF NOT EXISTS {schema}.idx_phq9_timestamp ON phq9_responses (timestamp)"
+    )
+
+def init_database():
+    """Inicializar base de datos SQLite"""
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    
+    if DB_WAL_MODE or READ_REPLICA_ENABLED:
+        # En modo WAL los lectores (respaldos y copias de la réplica) no bloquean a los
+        # escritores; la réplica lo exige para no detener los envíos en cada refresco
+        cursor.execute("PRAGMA journal_mode=WAL")
+
+    create_responses_table(cursor)
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_phq9_patient ON phq9_responses (patient_email)"
+    )
+
+    if PACKED_ANSWERS:
+        # Columna generada (virtual) con las diez respuestas empaquetadas, indexada
+        columns = [row[1] for row in cursor.execute("PRAGMA table_xinfo(phq9_responses)")]
+        if 'answers_packed' not in columns:
+            cursor.execute(
+                f"ALTER TABLE phq9_responses ADD COLUMN answers_packed INTEGER "
+                f"GENERATED ALWAYS AS ({PACKED_ANSWERS_SQL}) VIRTUAL"
+            )
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_phq9_answers_packed ON phq9_responses (answers_packed)"
+        )
+
+    # Contadores por paciente: se mantienen al guardar y sobreviven al archivado,
+    # de modo que la numeración de mediciones no depende de la tabla caliente
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS patient_summary (
+            patient_email TEXT PRIMARY KEY,
+            measurement_count INTEGER NOT NULL,
+            last_score INTEGER,
+            last_timestamp TEXT
+        )
+    ''')
+
+    # Migración: poblar los contadores a partir de las respuestas existentes
+    cursor.execute("SELECT 1 FROM patient_summary LIMIT 1")
+    if cursor.fetchone() is None:
+        cursor.execute('''
+            INSERT INTO patient_summary (patient_email, measurement_count, last_score, last_timestamp)
+            SELECT
+                p.patient_email,
+                COUNT(*),
+                (SELECT total_score FROM phq9_responses l
+                 WHERE l.patient_email = p.patient_email ORDER BY l.id DESC LIMIT 1),
+                MAX(p.timestamp)
+            FROM phq9_responses p
+            GROUP BY p.patient_email
+        ''')
     
     conn.commit()
     conn.close()
@@ -71,13 +229,13 @@ def get_measurement_number(patient_email):
     cursor = conn.cursor()
     
     cursor.execute(
-        "SELECT COUNT(*) FROM phq9_responses WHERE patient_email = ?",
+        "SELECT measurement_count FROM patient_summary WHERE patient_email = ?",
         (patient_email,)
     )
-    count = cursor.fetchone()[0]
+    result = cursor.fetchone()
     conn.close()
     
-    return count + 1
+    return (result[0] if result else 0) + 1
 
 def get_previous_score(patient_email):
     """Obtener el puntaje de la medición anterior"""
@@ -85,7 +243,7 @@ def get_previous_score(patient_email):
     cursor = conn.cursor()
     
     cursor.execute(
-        "SELECT total_score FROM phq9_responses WHERE patient_email = ? ORDER BY id DESC LIMIT 1",
+        "SELECT last_score FROM patient_summary WHERE patient_email = ?",
         (patient_email,)
     )
     result = cursor.fetchone()
@@ -95,6 +253,7 @@ def get_previous_score(patient_email):
 
 def save_phq9_response(data):
     """Guardar respuesta PHQ-9 en la base de datos"""
+    started = time.perf_counter()
     conn = sqlite3.connect(DB_PATH)
     cursor = conn.cursor()
     
@@ -118,30 +277,803 @@ def save_phq9_response(data):
         data['difficulty'],
         data['total_score']
     ))
+    cursor.execute('''
+        INSERT INTO patient_summary (patient_email, measurement_count, last_score, last_timestamp)
+        VALUES (?, 1, ?, ?)
+        ON CONFLICT (patient_email) DO UPDATE SET
+            measurement_count = measurement_count + 1,
+            last_score = excluded.last_score,
+            last_timestamp = excluded.last_timestamp
+    ''', (data['email'], data['total_score'], data['timestamp']))
     
     conn.commit()
     conn.close()
+    _record_write_latency(time.time(), (time.perf_counter() - started) * 1000)
     logger.info(f"Respuesta guardada para paciente: {data['email']}")
 
-def get_all_phq9_responses():
-    conn = sqlite3.connect(DB_PATH)
+def _iter_responses(columns, date_from=None, date_to=None, replica=False, archives=True,
+                    archive_columns=None):
+    """Recorrer respuestas (más recientes primero) de la base principal y de los archivos
+    mensuales que cubre el rango date_from..date_to (YYYY-MM-DD, inclusive).
+
+    Los archivos solo se adjuntan, en modo lectura, si el rango los cubre y archives=True.
+    Con replica=True se lee de la réplica si está dentro del límite de antigüedad.
+    archive_columns sustituye a columns en los archivos (p. ej. sin columnas generadas).
+    """
+    conditions = []
+    params = []
+    if date_from:
+        conditions.append("timestamp >= ?")
+        params.append(date_from)
+    if date_to:
+        conditions.append("timestamp < ?")
+        params.append(_next_day(date_to))
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+    query = """
+        SELECT {columns}
+        FROM {schema}.phq9_responses
+        {where}
+        ORDER BY timestamp DESC
+    """
+
+    db_path = read_db_path() if replica else DB_PATH
+    if db_path == DB_PATH:
+        conn = sqlite3.connect(DB_PATH, uri=True)
+    else:
+        conn = sqlite3.connect(f"{Path(db_path).resolve().as_uri()}?mode=ro", uri=True)
     conn.row_factory = sqlite3.Row
     cursor = conn.cursor()
+    try:
+        yield from cursor.execute(query.format(columns=columns, schema='main', where=where), params)
+
+        # Los archivos contienen solo datos anteriores al corte, por lo que basta con
+        # recorrerlos del mes más reciente al más antiguo para mantener el orden
+        for path in (list_archive_files(date_from, date_to) if archives else []):
+            cursor.execute("ATTACH DATABASE ? AS archivo", (f"{path.as_uri()}?mode=ro",))
+            try:
+                yield from cursor.execute(
+                    query.format(columns=archive_columns or columns, schema='archivo', where=where), params
+                )
+            finally:
+                cursor.execute("DETACH DATABASE archivo")
+    finally:
+        conn.close()
+
+def get_all_phq9_responses(date_from=None, date_to=None, replica=False, archives=True):
+    """Obtener respuestas (más recientes primero) entre date_from y date_to (YYYY-MM-DD, inclusive)"""
+    return list(_iter_responses(
+        "patient_email, timestamp, measurement_number, total_score, q9",
+        date_from, date_to, replica, archives
+    ))
 
-    cursor.execute("""
-        SELECT 
-            patient_email,
-            timestamp,
-            measurement_number,
-            total_score,
-            q9
-        FROM phq9_responses
-        ORDER BY timestamp DESC
-    """)
+def _next_day(date_text):
+    """Día siguiente a una fecha YYYY-MM-DD, como límite superior exclusivo"""
+    return (datetime.strptime(date_text[:10], '%Y-%m-%d') + timedelta(days=1)).strftime('%Y-%m-%d')
+
+def archive_path(month):
+    """Ruta del archivo mensual para un mes YYYY-MM"""
+    year, month_number = month.split('-')
+    return os.path.join(ARCHIVE_DIR, f"phq9_archivo_{year}_{month_number}.db")
+
+def list_archive_files(date_from=None, date_to=None):
+    """Listar archivos mensuales que se solapan con el rango, del más reciente al más antiguo"""
+    if not os.path.isdir(ARCHIVE_DIR):
+        return []
+
+    selected = []
+    for name in os.listdir(ARCHIVE_DIR):
+        match = ARCHIVE_FILE_PATTERN.match(name)
+        if not match:
+            continue
+        month = f"{match.group(1)}-{match.group(2)}"
+        if date_from and month < date_from[:7]:
+            continue
+        if date_to and month > date_to[:7]:
+            continue
+        selected.append((month, name))
+
+    selected.sort(reverse=True)
+    return [Path(ARCHIVE_DIR, name).resolve() for _, name in selected]
+
+def archive_old_responses(max_age_days=None, vacuum=False):
+    """Mover respuestas más antiguas que max_age_days a archivos SQLite mensuales.
+
+    Cada mes se copia y se elimina de la base principal en una sola transacción.
+    Los contadores de patient_summary no se modifican. Devuelve {mes: filas movidas}.
+    """
+    if max_age_days is None:
+        max_age_days = HOT_RETENTION_DAYS
+    cutoff = (datetime.now() - timedelta(days=max_age_days)).isoformat()
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT DISTINCT substr(timestamp, 1, 7) FROM phq9_responses WHERE timestamp < ?",
+        (cutoff,)
+    )
+    months = [row[0] for row in cursor.fetchall()]
+
+    moved = {}
+    for month in months:
+        cursor.execute("ATTACH DATABASE ? AS archivo", (archive_path(month),))
+        try:
+            create_responses_table(cursor, 'archivo')
+            cursor.execute('''
+                INSERT OR IGNORE INTO archivo.phq9_responses ({RESPONSE_COLUMNS})
+                SELECT {RESPONSE_COLUMNS} FROM main.phq9_responses
+                WHERE timestamp < ? AND substr(timestamp, 1, 7) = ?
+            '''.format(RESPONSE_COLUMNS=RESPONSE_COLUMNS), (cutoff, month))
+            cursor.execute(
+                "DELETE FROM main.phq9_responses WHERE timestamp < ? AND substr(timestamp, 1, 7) = ?",
+                (cutoff, month)
+            )
+            moved[month] = cursor.rowcount
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.execute("DETACH DATABASE archivo")
+        logger.info(f"Archivadas {moved[month]} respuestas de {month}")
+
+    if vacuum and moved:
+        # Compactar la base caliente para que siga cabiendo en la caché de páginas
+        cursor.execute("VACUUM")
 
-    rows = cursor.fetchall()
     conn.close()
-    return rows
+    return moved
+
+@app.cli.command('archive-responses')
+@click.option('--days', type=int, default=None, help='Antigüedad mínima en días (por defecto HOT_RETENTION_DAYS)')
+@click.option('--vacuum', is_flag=True, help='Compactar la base principal tras archivar')
+def archive_responses_command(days, vacuum):
+    """Archivar respuestas antiguas en archivos mensuales"""
+    moved = archive_old_responses(days, vacuum)
+    click.echo(f"Respuestas archivadas: {sum(moved.values())} en {len(moved)} archivo(s) mensual(es)")
+
+def _file_sha256(path):
+    """Calcular SHA-256 de un archivo por bloques"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _write_checksum(path):
+    checksum = _file_sha256(path)
+    with open(f"{path}.sha256", 'w') as f:
+        f.write(f"{checksum}  {os.path.basename(path)}\n")
+    return checksum
+
+class _BackupRestartLimit(Exception):
+    """La copia por pasos se reinició más de BACKUP_MAX_RESTARTS veces"""
+
+def _online_copy(dest, throttle=True):
+    """Copiar DB_PATH a dest con la API de respaldo.
+
+    Con throttle=True (respaldos) copia por pasos y con pausas entre ellos. En modo
+    WAL se mantiene una transacción de lectura durante toda la copia: la instantánea
+    es consistente y no se reinicia con cada escritura, sin bloquear a los escritores.
+    En modo rollback cada paso toma el bloqueo compartido solo durante
+    BACKUP_PAGES_PER_STEP páginas, pero cada escritura de otra conexión reinicia la
+    copia; tras BACKUP_MAX_RESTARTS reinicios se termina con una copia en un paso.
+
+    Con throttle=False (réplica) copia en un único paso, sin pausas ni transacción
+    fijada, de modo que el bloqueo de lectura dura solo lo que tarda la copia y no
+    retiene los checkpoints del WAL.
+    """
+    steps = []
+    restarts = 0
+    last_remaining = None
+
+    def progress(status, remaining, total):
+        nonlocal restarts, last_remaining
+        if last_remaining is not None and remaining > last_remaining:
+            restarts += 1
+            if restarts > BACKUP_MAX_RESTARTS:
+                raise _BackupRestartLimit()
+        last_remaining = remaining
+        steps.append(total)
+        if throttle and remaining:
+            time.sleep(BACKUP_STEP_SLEEP)
+
+    src = sqlite3.connect(DB_PATH, isolation_level=None)
+    dst = sqlite3.connect(dest)
+    fallback = False
+    try:
+        pin_snapshot = throttle and src.execute("PRAGMA journal_mode").fetchone()[0] == 'wal'
+        if pin_snapshot:
+            src.execute("BEGIN")
+            src.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+        try:
+            src.backup(dst, pages=BACKUP_PAGES_PER_STEP if throttle else -1, progress=progress)
+        except _BackupRestartLimit:
+            fallback = True
+            logger.warning(f"Copia reiniciada {restarts} veces por escrituras; se completa en un solo paso")
+            src.backup(dst, pages=-1)
+        if pin_snapshot:
+            src.execute("COMMIT")
+        # La copia se deja como archivo autónomo, sin -wal asociado
+        dst.execute("PRAGMA journal_mode=DELETE")
+    finally:
+        dst.close()
+        src.close()
+
+    return {
+        'steps': len(steps),
+        'pages': steps[-1] if steps else 0,
+        'restarts': restarts,
+        'single_step_fallback': fallback,
+    }
+
+def _check_integrity(path):
+    conn = sqlite3.connect(f"{Path(path).resolve().as_uri()}?mode=ro", uri=True)
+    try:
+        result = conn.execute("PRAGMA quick_check").fetchone()[0]
+    finally:
+        conn.close()
+    if result != 'ok':
+        raise RuntimeError(f"Respaldo corrupto ({os.path.basename(path)}): {result}")
+
+def _list_backups(suffix):
+    if not os.path.isdir(BACKUP_DIR):
+        return []
+    return sorted(
+        name for name in os.listdir(BACKUP_DIR)
+        if name.startswith('phq9_') and name.endswith(suffix)
+    )
+
+DELTA_MAGIC = b'PHQ9DELTA1'
+
+def _write_delta(base_path, new_path, delta_path):
+    """Guardar solo las páginas de new_path que difieren del respaldo completo base_path.
+
+    Formato: DELTA_MAGIC, cabecera JSON de una línea y registros (número de página, página).
+    """
+    conn = sqlite3.connect(new_path)
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    conn.close()
+
+    header = {
+        'base': os.path.basename(base_path),
+        'base_sha256': _file_sha256(base_path),
+        'page_size': page_size,
+        'size': os.path.getsize(new_path),
+    }
+    changed = 0
+    with open(base_path, 'rb') as base, open(new_path, 'rb') as new, open(delta_path, 'wb') as out:
+        out.write(DELTA_MAGIC + json.dumps(header).encode() + b'\n')
+        page_number = 0
+        while True:
+            page = new.read(page_size)
+            if not page:
+                break
+            if base.read(page_size) != page:
+                out.write(struct.pack('>I', page_number) + page)
+                changed += 1
+            page_number += 1
+    return changed
+
+def restore_backup(name, dest):
+    """Restaurar un respaldo completo (.db) o incremental (.delta) en dest"""
+    path = os.path.join(BACKUP_DIR, name)
+    verify_backup(name)
+
+    if name.endswith('.db'):
+        shutil.copyfile(path, dest)
+        return dest
+
+    with open(path, 'rb') as delta:
+        if delta.read(len(DELTA_MAGIC)) != DELTA_MAGIC:
+            raise ValueError(f"Archivo incremental inválido: {name}")
+        header = json.loads(delta.readline())
+        base_path = os.path.join(BACKUP_DIR, header['base'])
+        if _file_sha256(base_path) != header['base_sha256']:
+            raise RuntimeError(f"El respaldo base {header['base']} no coincide con {name}")
+
+        page_size = header['page_size']
+        shutil.copyfile(base_path, dest)
+        with open(dest, 'r+b') as out:
+            while True:
+                record = delta.read(4 + page_size)
+                if not record:
+                    break
+                out.seek(struct.unpack('>I', record[:4])[0] * page_size)
+                out.write(record[4:])
+            out.truncate(header['size'])
+
+    _check_integrity(dest)
+    return dest
+
+def verify_backup(name):
+    """Verificar la suma SHA-256 de un respaldo (y su integridad si es completo)"""
+    path = os.path.join(BACKUP_DIR, name)
+    with open(f"{path}.sha256") as f:
+        expected = f.read().split()[0]
+    if _file_sha256(path) != expected:
+        raise RuntimeError(f"Suma de verificación incorrecta: {name}")
+    if name.endswith('.db'):
+        _check_integrity(path)
+
+def rotate_backups(keep=None):
+    """Conservar los `keep` respaldos completos más recientes y sus incrementales"""
+    if keep is None:
+        keep = BACKUP_RETENTION
+    fulls = _list_backups('.db')
+    if len(fulls) <= keep:
+        return []
+
+    oldest_kept = fulls[-keep][:-len('.db')] if keep else None
+    removed = fulls[:-keep] if keep else fulls
+    # Los incrementales dependen del completo anterior a ellos
+    removed += [
+        name for name in _list_backups('.delta')
+        if oldest_kept is None or name[:-len('.delta')] < oldest_kept
+    ]
+    for name in removed:
+        for path in (os.path.join(BACKUP_DIR, name), os.path.join(BACKUP_DIR, f"{name}.sha256")):
+            if os.path.exists(path):
+                os.remove(path)
+    logger.info(f"Respaldos eliminados por rotación: {len(removed)}")
+    return removed
+
+def _write_file_atomically(path, content):
+    """Escribir un archivo de texto mediante un temporal único y os.replace"""
+    fd, partial = tempfile.mkstemp(dir=os.path.dirname(path) or '.', suffix='.parcial')
+    with os.fdopen(fd, 'w') as f:
+        f.write(content)
+    os.replace(partial, path)
+
+def _record_write_latency(finished_at, elapsed_ms):
+    """Anotar la latencia de una escritura; un fallo aquí nunca afecta al envío.
+
+    Solo se registra con respaldos programados o mientras hay un respaldo en curso.
+    """
+    if BACKUP_INTERVAL_HOURS <= 0 and not os.path.exists(BACKUP_IN_PROGRESS_PATH):
+        return
+    try:
+        os.makedirs(BACKUP_DIR, exist_ok=True)
+        with open(WRITE_LATENCY_LOG, 'a') as f:
+            f.write(f"{finished_at:.6f} {elapsed_ms:.3f}\n")
+            size = f.tell()
+        if size > WRITE_LATENCY_LOG_MAX_BYTES:
+            # Conservar solo la mitad más reciente
+            with open(WRITE_LATENCY_LOG) as f:
+                lines = f.readlines()
+            _write_file_atomically(WRITE_LATENCY_LOG, ''.join(lines[len(lines) // 2:]))
+    except OSError as e:
+        logger.warning(f"No se pudo registrar la latencia de escritura: {str(e)}")
+
+def _read_write_latencies():
+    samples = []
+    try:
+        with open(WRITE_LATENCY_LOG) as f:
+            for line in f:
+                try:
+                    at, ms = line.split()
+                    samples.append((float(at), float(ms)))
+                except ValueError:
+                    continue
+    except OSError:
+        pass
+    return samples
+
+def _write_latency_summary(since, until):
+    """Latencia media de escritura (de cualquier proceso) durante el respaldo frente a la previa"""
+    samples = _read_write_latencies()
+    during = [ms for at, ms in samples if since <= at <= until]
+    before = [ms for at, ms in samples if at < since]
+
+    def mean(values):
+        return round(sum(values) / len(values), 2) if values else None
+
+    return {
+        'writes_during': len(during),
+        'write_latency_ms_during': mean(during),
+        'write_latency_ms_max_during': round(max(during), 2) if during else None,
+        'write_latency_ms_before': mean(before),
+    }
+
+def load_last_backup_report():
+    """Último reporte de respaldo, sea cual sea el proceso que lo generó"""
+    try:
+        with open(LAST_BACKUP_REPORT_PATH) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def backup_database(incremental=False):
+    """Respaldo en línea de DB_PATH en BACKUP_DIR, sin detener los envíos.
+
+    Con incremental=True (y un respaldo completo previo) solo se guardan las páginas
+    modificadas respecto al último completo. Devuelve un reporte con duración,
+    suma de verificación y el efecto observado en la latencia de escritura.
+    """
+    os.makedirs(BACKUP_DIR, exist_ok=True)
+    stamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+    base_name = f"phq9_{stamp}"
+    partial = os.path.join(BACKUP_DIR, f"{base_name}.parcial")
+
+    started = time.monotonic()
+    started_at = time.time()
+    # Mientras exista la marca, los envíos de cualquier proceso anotan su latencia
+    with open(BACKUP_IN_PROGRESS_PATH, 'w') as f:
+        f.write(str(os.getpid()))
+    try:
+        copy = _online_copy(partial)
+    finally:
+        os.remove(BACKUP_IN_PROGRESS_PATH)
+    _check_integrity(partial)
+
+    fulls = _list_backups('.db')
+    if incremental and fulls:
+        name = f"{base_name}.delta"
+        changed = _write_delta(os.path.join(BACKUP_DIR, fulls[-1]), partial, os.path.join(BACKUP_DIR, name))
+        os.remove(partial)
+    else:
+        name = f"{base_name}.db"
+        changed = copy['pages']
+        os.replace(partial, os.path.join(BACKUP_DIR, name))
+    checksum = _write_checksum(os.path.join(BACKUP_DIR, name))
+    finished = time.monotonic()
+
+    report = {
+        'file': name,
+        'type': 'incremental' if name.endswith('.delta') else 'completo',
+        'pages_total': copy['pages'],
+        'pages_written': changed,
+        'steps': copy['steps'],
+        'restarts': copy['restarts'],
+        'single_step_fallback': copy['single_step_fallback'],
+        'bytes': os.path.getsize(os.path.join(BACKUP_DIR, name)),
+        'sha256': checksum,
+        'duration_s': round(finished - started, 3),
+        'finished_at': datetime.now().isoformat(),
+    }
+    report.update(_write_latency_summary(started_at, time.time()))
+    _write_file_atomically(LAST_BACKUP_REPORT_PATH, json.dumps(report))
+    logger.info(f"Respaldo {report['type']} creado: {json.dumps(report)}")
+
+    rotate_backups()
+    return report
+
+def _try_lock(lock_path):
+    """Bloqueo exclusivo no bloqueante sobre lock_path; devuelve el archivo abierto o None"""
+    lock_file = open(lock_path, 'w')
+    if fcntl is not None:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return None
+    return lock_file
+
+def _periodic_loop(name, interval_seconds, job, lock_path, run_immediately):
+    lock_file = None
+    first = True
+    while True:
+        if not (first and run_immediately):
+            time.sleep(interval_seconds)
+        first = False
+        # Se reintenta en cada ciclo: si el worker que tenía el bloqueo se recicla, otro lo toma
+        if lock_file is None:
+            lock_file = _try_lock(lock_path)
+            if lock_file is None:
+                continue
+            logger.info(f"Tarea periódica {name}: este proceso la ejecuta")
+        try:
+            job()
+        except Exception as e:
+            logger.error(f"Error en tarea periódica {name}: {str(e)}")
+
+def start_periodic_job(name, interval_seconds, job, lock_path, run_immediately=False):
+    """Ejecutar `job` cada `interval_seconds` en un hilo de fondo (con run_immediately, también al iniciar).
+
+    Todos los workers de gunicorn inician el hilo, pero solo el que obtiene el bloqueo
+    de lock_path ejecuta la tarea; los demás reintentan el bloqueo en cada ciclo.
+    """
+    thread = threading.Thread(
+        target=_periodic_loop, args=(name, interval_seconds, job, lock_path, run_immediately), daemon=True
+    )
+    thread.start()
+    logger.info(f"Tarea periódica {name} iniciada (cada {interval_seconds} s)")
+    return thread
+
+def start_backup_scheduler():
+    """Iniciar los respaldos periódicos si BACKUP_INTERVAL_HOURS > 0"""
+    if BACKUP_INTERVAL_HOURS <= 0:
+        return False
+
+    runs = itertools.count()
+
+    def scheduled_backup():
+        incremental = BACKUP_INCREMENTAL and next(runs) % max(BACKUP_FULL_EVERY, 1) != 0
+        backup_database(incremental=incremental)
+
+    os.makedirs(BACKUP_DIR, exist_ok=True)
+    return start_periodic_job(
+        'respaldos', BACKUP_INTERVAL_HOURS * 3600, scheduled_backup,
+        os.path.join(BACKUP_DIR, '.programador.lock')
+    )
+
+@app.cli.command('backup')
+@click.option('--incremental', is_flag=True, help='Guardar solo las páginas modificadas desde el último respaldo completo')
+def backup_command(incremental):
+    """Crear un respaldo en línea de la base de datos"""
+    report = backup_database(incremental=incremental)
+    click.echo(json.dumps(report, indent=2, ensure_ascii=False))
+
+@app.cli.command('verify-backups')
+def verify_backups_command():
+    """Verificar sumas SHA-256 e integridad de todos los respaldos"""
+    failed = 0
+    for name in _list_backups('.db') + _list_backups('.delta'):
+        try:
+            verify_backup(name)
+            click.echo(f"OK     {name}")
+        except Exception as e:
+            failed += 1
+            click.echo(f"FALLO  {name}: {e}")
+    if failed:
+        raise SystemExit(1)
+
+@app.cli.command('restore-backup')
+@click.argument('name')
+@click.argument('dest')
+def restore_backup_command(name, dest):
+    """Restaurar el respaldo NAME en el archivo DEST"""
+    restore_backup(name, dest)
+    click.echo(f"Respaldo {name} restaurado en {dest}")
+
+def replica_age():
+    """Antigüedad en segundos de la réplica de lectura (None si no existe)"""
+    try:
+        return time.time() - os.path.getmtime(READ_REPLICA_PATH)
+    except OSError:
+        return None
+
+def read_db_path():
+    """Base para lecturas de admin/analítica: la réplica si está activa y dentro del
+    límite de antigüedad; en otro caso, la base principal"""
+    if not READ_REPLICA_ENABLED:
+        return DB_PATH
+    age = replica_age()
+    if age is None or age > READ_REPLICA_MAX_STALENESS:
+        logger.warning("Réplica de lectura ausente o desactualizada; se usa la base principal")
+        return DB_PATH
+    return READ_REPLICA_PATH
+
+def refresh_read_replica():
+    """Actualizar la réplica con una copia en línea y reemplazarla de forma atómica.
+
+    Las lecturas en curso conservan la versión anterior. La fecha de modificación
+    se fija al inicio de la copia, que es el momento que refleja su contenido.
+    """
+    conn = sqlite3.connect(DB_PATH)
+    journal_mode = conn.execute("PRAGMA journal_mode").fetchone()[0]
+    conn.close()
+    if journal_mode != 'wal':
+        # En modo rollback la copia en un paso retendría los commits de los envíos
+        raise RuntimeError("La réplica de lectura requiere journal_mode=WAL en la base principal")
+
+    started = time.time()
+    fd, partial = tempfile.mkstemp(
+        dir=os.path.dirname(os.path.abspath(READ_REPLICA_PATH)), suffix='.parcial'
+    )
+    os.close(fd)
+    try:
+        copy = _online_copy(partial, throttle=False)
+        os.utime(partial, (started, started))
+        os.replace(partial, READ_REPLICA_PATH)
+    except BaseException:
+        os.remove(partial)
+        raise
+    logger.info(f"Réplica de lectura actualizada: {copy['pages']} páginas en {time.time() - started:.2f} s")
+    return copy
+
+@app.cli.command('refresh-replica')
+def refresh_replica_command():
+    """Actualizar la réplica de lectura"""
+    copy = refresh_read_replica()
+    click.echo(f"Réplica actualizada: {copy['pages']} páginas en {READ_REPLICA_PATH}")
+
+def unpack_answers(packed):
+    """Desempaquetar la codificación de PACKED_ANSWERS_SQL en {'q1'..'q9', 'difficulty'}.
+
+    Acepta un entero o un arreglo NumPy de enteros (se desempaqueta elemento a elemento).
+    """
+    return {field: (packed >> (2 * index)) & 0b11 for index, field in enumerate(ANSWER_FIELDS)}
+
+# Formato de la instantánea: cabecera de 32 bytes y registros de 32 bytes (little-endian)
+SNAPSHOT_MAGIC = b'PHQ9SNP1'
+SNAPSHOT_HEADER = struct.Struct('<8sQd8x')  # firma, número de registros, creación (epoch)
+SNAPSHOT_RECORD = struct.Struct('<qdQIHBx')  # id, timestamp (epoch), clave de paciente, respuestas, medición, puntaje
+SNAPSHOT_DTYPE = [
+    ('id', '<i8'), ('timestamp', '<f8'), ('patient_key', '<u8'), ('answers', '<u4'),
+    ('measurement_number', '<u2'), ('total_score', 'u1'), ('_pad', 'u1'),
+]
+
+def _patient_key(email):
+    """Clave seudónima de 64 bits del paciente (no se guarda el correo en la instantánea)"""
+    return int.from_bytes(hashlib.sha256(email.encode('utf-8')).digest()[:8], 'little')
+
+def refresh_analytics_snapshot(path=None):
+    """Regenerar la instantánea binaria con todas las respuestas (principal y archivos).
+
+    Se escribe en un temporal único del mismo directorio y se reemplaza de forma
+    atómica: escritores concurrentes no se pisan y los lectores que ya tienen la
+    versión anterior mapeada no se ven afectados.
+    """
+    path = path or ANALYTICS_SNAPSHOT_PATH
+    started_at = time.time()
+    count = 0
+    skipped = 0
+
+    # La base principal (y su réplica) tiene la columna generada; los archivos calculan la expresión
+    packed_expression = f"({PACKED_ANSWERS_SQL}) AS answers"
+    columns = f"id, patient_email, timestamp, measurement_number, total_score, {', '.join(ANSWER_FIELDS)}, {{answers}}"
+    rows = _iter_responses(
+        columns.format(answers="answers_packed AS answers" if PACKED_ANSWERS else packed_expression),
+        replica=True,
+        archive_columns=columns.format(answers=packed_expression),
+    )
+
+    fd, partial = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix='.parcial')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(b'\0' * SNAPSHOT_HEADER.size)
+            for row in rows:
+                # Filas históricas (anteriores a la validación de envíos) con respuestas
+                # fuera de 0-3 o puntaje fuera de 0-27 no entran en la instantánea
+                if (any(row[field] not in range(4) for field in ANSWER_FIELDS)
+                        or row['total_score'] not in range(28)):
+                    skipped += 1
+                    continue
+                try:
+                    record = SNAPSHOT_RECORD.pack(
+                        row['id'],
+                        datetime.fromisoformat(row['timestamp']).timestamp(),
+                        _patient_key(row['patient_email']),
+                        row['answers'],
+                        row['measurement_number'],
+                        row['total_score'],
+                    )
+                except (struct.error, TypeError, ValueError):
+                    skipped += 1
+                    continue
+                f.write(record)
+                count += 1
+            f.seek(0)
+            f.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, count, started_at))
+        os.replace(partial, path)
+    except BaseException:
+        os.remove(partial)
+        raise
+
+    if skipped:
+        logger.warning(f"Instantánea analítica: {skipped} respuestas inválidas omitidas")
+    logger.info(f"Instantánea analítica actualizada: {count} registros en {time.time() - started_at:.2f} s")
+    return count
+
+class AnalyticsSnapshot:
+    """Lectura de la instantánea analítica mapeada en memoria, sin pasar por SQLite"""
+
+    def __init__(self, path=None):
+        self.path = path or ANALYTICS_SNAPSHOT_PATH
+        with open(self.path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count, self.created_at = SNAPSHOT_HEADER.unpack_from(self._mmap)
+        if magic != SNAPSHOT_MAGIC:
+            raise ValueError(f"Instantánea inválida: {self.path}")
+        self._records = memoryview(self._mmap)[
+            SNAPSHOT_HEADER.size:SNAPSHOT_HEADER.size + self.count * SNAPSHOT_RECORD.size
+        ]
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        """Tuplas (id, timestamp, patient_key, answers, measurement_number, total_score)"""
+        return SNAPSHOT_RECORD.iter_unpack(self._records)
+
+    def as_array(self):
+        """Vista NumPy (arreglo estructurado) sobre el mmap, sin copia; requiere NumPy"""
+        if np is None:
+            raise RuntimeError("NumPy no está instalado")
+        return np.frombuffer(self._records, dtype=np.dtype(SNAPSHOT_DTYPE))
+
+    def population_summary(self):
+        """Distribución de puntajes, severidad y respuestas positivas por ítem en toda la población"""
+        if np is not None:
+            records = self.as_array()
+            # Puntajes 0-27: coincide con las bandas de severidad (refresh_analytics_snapshot filtra el resto)
+            histogram = np.bincount(records['total_score'], minlength=28)[:28].tolist()
+            item_positive = {
+                field: int(np.count_nonzero(values))
+                for field, values in unpack_answers(records['answers']).items() if field != 'difficulty'
+            }
+        else:
+            histogram = [0] * 28
+            item_positive = dict.fromkeys(ANSWER_FIELDS[:9], 0)
+            for _, _, _, answers, _, total_score in self:
+                if total_score > 27:
+                    continue
+                histogram[total_score] += 1
+                for field, value in unpack_answers(answers).items():
+                    if value and field != 'difficulty':
+                        item_positive[field] += 1
+
+        bands = {'minima': (0, 4), 'leve': (5, 9), 'moderada': (10, 14),
+                 'moderadamente_severa': (15, 19), 'severa': (20, 27)}
+        return {
+            'responses': self.count,
+            'snapshot_created_at': datetime.fromtimestamp(self.created_at).isoformat(),
+            'score_histogram': histogram,
+            'severity': {band: sum(histogram[low:high + 1]) for band, (low, high) in bands.items()},
+            'item_positive': item_positive,
+            'item9_positive': item_positive['q9'],
+        }
+
+    def close(self):
+        self._records.release()
+        self._mmap.close()
+
+_snapshot_cache = {}
+
+def load_analytics_snapshot():
+    """Instantánea actual (se reabre solo si el archivo cambió).
+
+    Devuelve None si aún no existe o supera ANALYTICS_SNAPSHOT_MAX_AGE_MINUTES; nunca
+    se genera dentro de una petición.
+    """
+    try:
+        stat = os.stat(ANALYTICS_SNAPSHOT_PATH)
+    except OSError:
+        return None
+    key = (stat.st_ino, stat.st_mtime_ns)
+    if _snapshot_cache.get('key') != key:
+        _snapshot_cache['snapshot'] = AnalyticsSnapshot(ANALYTICS_SNAPSHOT_PATH)
+        _snapshot_cache['key'] = key
+
+    snapshot = _snapshot_cache['snapshot']
+    if time.time() - snapshot.created_at > ANALYTICS_SNAPSHOT_MAX_AGE_MINUTES * 60:
+        return None
+    return snapshot
+
+_background_jobs_started = False
+
+def start_background_jobs():
+    """Iniciar las tareas periódicas configuradas (respaldos, réplica, instantánea analítica).
+
+    Se llama desde post_worker_init en gunicorn.conf.py o al ejecutar el servidor de
+    desarrollo; nunca al importar el módulo, para que los comandos `flask ...` de
+    corta duración no lancen tareas que morirían a medio escribir.
+    """
+    global _background_jobs_started
+    if _background_jobs_started:
+        return
+    _background_jobs_started = True
+
+    start_backup_scheduler()
+    if READ_REPLICA_ENABLED:
+        # La primera copia se hace al arrancar para no servir desde la principal mientras tanto
+        start_periodic_job(
+            'réplica de lectura', READ_REPLICA_REFRESH_SECONDS, refresh_read_replica,
+            f"{READ_REPLICA_PATH}.lock", run_immediately=True
+        )
+    if ANALYTICS_SNAPSHOT_MINUTES > 0:
+        start_periodic_job(
+            'instantanea analitica', ANALYTICS_SNAPSHOT_MINUTES * 60, refresh_analytics_snapshot,
+            f"{ANALYTICS_SNAPSHOT_PATH}.lock", run_immediately=True
+        )
+
+@app.cli.command('refresh-snapshot')
+def refresh_snapshot_command():
+    """Regenerar la instantánea analítica binaria"""
+    count = refresh_analytics_snapshot()
+    click.echo(f"Instantánea analítica: {count} registros en {ANALYTICS_SNAPSHOT_PATH}")
 
 def get_response_text(value):
     """Convertir valor numérico a texto descriptivo"""
@@ -220,6 +1152,225 @@ Sistema PHQ-9 Clínico - Dr. Breison Velarde
         logger.error(f"Error enviando correo: {str(e)}")
         return False
 
+class AdmissionController:
+    """Limita la concurrencia por ruta y global, con colas de espera acotadas y prioridades.
+
+    Cuando se libera un hueco entra el primer solicitante admisible según (prioridad, llegada).
+    Si la cola de la ruta está llena o se agota la espera, la petición se rechaza.
+    """
+
+    def __init__(self, max_concurrent, routes):
+        self.max_concurrent = max_concurrent
+        self.routes = routes
+        self._condition = threading.Condition()
+        self._waiters = []
+        self._sequence = itertools.count()
+        self._active_total = 0
+        self._stats = {
+            route: {'active': 0, 'waiting': 0, 'admitted': 0, 'shed_queue_full': 0, 'shed_timeout': 0}
+            for route in routes
+        }
+
+    def _can_run(self, route):
+        return (self._active_total < self.max_concurrent
+                and self._stats[route]['active'] < self.routes[route]['limit'])
+
+    def _is_next(self, entry):
+        for waiter in sorted(self._waiters):
+            if self._can_run(waiter[2]):
+                return waiter is entry
+        return False
+
+    def acquire(self, route):
+        """Reservar un hueco para `route`; devuelve False si la petición debe rechazarse"""
+        config = self.routes[route]
+        stats = self._stats[route]
+        with self._condition:
+            if not self._waiters and self._can_run(route):
+                self._admit(route)
+                return True
+            if stats['waiting'] >= config['queue']:
+                stats['shed_queue_full'] += 1
+                return False
+
+            entry = (config['priority'], next(self._sequence), route)
+            heapq.heappush(self._waiters, entry)
+            stats['waiting'] += 1
+            deadline = time.monotonic() + config['timeout']
+            try:
+                while not self._is_next(entry):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        stats['shed_timeout'] += 1
+                        return False
+                    self._condition.wait(remaining)
+                self._admit(route)
+                return True
+            finally:
+                self._waiters.remove(entry)
+                heapq.heapify(self._waiters)
+                stats['waiting'] -= 1
+                # Otro solicitante puede haber quedado al frente
+                self._condition.notify_all()
+
+    def _admit(self, route):
+        self._active_total += 1
+        self._stats[route]['active'] += 1
+        self._stats[route]['admitted'] += 1
+
+    def release(self, route):
+        with self._condition:
+            self._active_total -= 1
+            self._stats[route]['active'] -= 1
+            self._condition.notify_all()
+
+    def snapshot(self):
+        with self._condition:
+            return {
+                'active_total': self._active_total,
+                'max_concurrent': self.max_concurrent,
+                'routes': {route: dict(stats) for route, stats in self._stats.items()},
+            }
+
+admission = AdmissionController(ADMISSION_MAX_CONCURRENT, ADMISSION_ROUTES)
+
+def admission_controlled(route):
+    """Decorador: aplica el control de admisión y responde 503 con Retry-After en sobrecarga"""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if not admission.acquire(route):
+                logger.warning(f"Petición rechazada por sobrecarga: {route}")
+                response = jsonify({'success': False, 'error': 'Servicio ocupado, intente más tarde'})
+                response.status_code = 503
+                response.headers['Retry-After'] = str(ADMISSION_RETRY_AFTER)
+                return response
+            try:
+                return view(*args, **kwargs)
+            finally:
+                admission.release(route)
+        return wrapper
+    return decorator
+
+class StackSampler:
+    """Perfilador por muestreo de bajo coste: captura la pila de un hilo cada `interval` segundos"""
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def dump(self, path):
+        """Escribir pilas en formato colapsado (compatible con flamegraph.pl / speedscope)"""
+        with open(path, 'w') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+def _valid_profiling_token():
+    token = request.headers.get('X-Profile-Token', '')
+    return bool(PROFILING_SECRET) and hmac.compare_digest(token, PROFILING_SECRET)
+
+def _start_request_profile():
+    if request.endpoint not in PROFILING_ENDPOINTS:
+        return
+    if not _valid_profiling_token() and random.random() >= PROFILING_SAMPLE_RATE:
+        return
+
+    if PROFILING_MODE == 'sampling':
+        profiler = StackSampler(threading.get_ident(), PROFILING_SAMPLE_INTERVAL)
+        profiler.start()
+    else:
+        profiler = cProfile.Profile()
+        profiler.enable()
+    g.profiler = profiler
+    g.profile_started = time.perf_counter()
+
+def _finish_request_profile(response):
+    profiler = g.pop('profiler', None)
+    if profiler is None:
+        return response
+
+    elapsed_ms = (time.perf_counter() - g.profile_started) * 1000
+    if isinstance(profiler, StackSampler):
+        profiler.stop()
+        extension = 'folded'
+    else:
+        profiler.disable()
+        extension = 'pstats'
+
+    try:
+        os.makedirs(PROFILING_DIR, exist_ok=True)
+        name = f"{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}_{request.endpoint}_{elapsed_ms:.0f}ms.{extension}"
+        path = os.path.join(PROFILING_DIR, name)
+        if isinstance(profiler, StackSampler):
+            profiler.dump(path)
+        else:
+            profiler.dump_stats(path)
+        response.headers['X-Profile-File'] = name
+        _rotate_profiles()
+    except Exception as e:
+        logger.error(f"Error guardando perfil: {str(e)}")
+    return response
+
+def _list_profiles():
+    if not os.path.isdir(PROFILING_DIR):
+        return []
+    return sorted(
+        (name for name in os.listdir(PROFILING_DIR) if name.endswith(('.pstats', '.folded'))),
+        reverse=True
+    )
+
+def _rotate_profiles():
+    for name in _list_profiles()[PROFILING_MAX_FILES:]:
+        os.remove(os.path.join(PROFILING_DIR, name))
+
+if PROFILING_ENABLED:
+    # Los hooks solo se registran si el perfilado está activo
+    app.before_request(_start_request_profile)
+    app.after_request(_finish_request_profile)
+
+if PROFILING_ENABLED and PROFILING_SECRET:
+    # Los perfiles contienen detalles internos: su descarga siempre exige el secreto,
+    # y sin secreto configurado (solo muestreo) estas rutas no existen
+    @app.route('/admin/perfiles', methods=['GET'])
+    def list_profiles():
+        """Listar los perfiles guardados (requiere X-Profile-Token)"""
+        if not _valid_profiling_token():
+            abort(403)
+        return jsonify({'profiles': [
+            {'name': name, 'bytes': os.path.getsize(os.path.join(PROFILING_DIR, name))}
+            for name in _list_profiles()
+        ]})
+
+    @app.route('/admin/perfiles/<path:name>', methods=['GET'])
+    def download_profile(name):
+        """Descargar un perfil .pstats o .folded (requiere X-Profile-Token)"""
+        if not _valid_profiling_token():
+            abort(403)
+        if name not in _list_profiles():
+            abort(404)
+        return send_from_directory(os.path.abspath(PROFILING_DIR), name, as_attachment=True)
+
 @app.route("/", methods=["GET"])
 def index():
     return render_template_string("""
@@ -455,6 +1606,9 @@ document.getElementById("phq9Form").addEventListener("submit", async function(e)
     if (res.ok) {
         alert("Cuestionario enviado correctamente. Los resultados serán revisados por su médico.");
         window.location.href = "/";
+    } else if (res.status === 503) {
+        const wait = res.headers.get("Retry-After") || "unos";
+        alert("El sistema está ocupado en este momento. Por favor, intente enviar nuevamente en " + wait + " segundos.");
     } else {
         alert("Ocurrió un error al enviar el cuestionario.");
     }
@@ -467,6 +1621,7 @@ document.getElementById("phq9Form").addEventListener("submit", async function(e)
     return render_template_string(html)
 
 @app.route('/api/submit-phq9', methods=['POST'])
+@admission_controlled('submit_phq9')
 def submit_phq9():
     """Endpoint para recibir y procesar respuestas PHQ-9"""
     try:
@@ -478,10 +1633,17 @@ def submit_phq9():
             if field not in data:
                 return jsonify({'success': False, 'error': f'Campo requerido: {field}'}), 400
 
-        difficulty = int(data.get('difficulty', 0))
+        # Validar respuestas: enteros 0-3 (la codificación compacta usa 2 bits por ítem)
+        try:
+            responses = {f'q{i}': int(data['responses'][f'q{i}']) for i in range(1, 10)}
+            difficulty = int(data.get('difficulty', 0))
+        except (KeyError, TypeError, ValueError):
+            return jsonify({'success': False, 'error': 'Respuestas incompletas o inválidas'}), 400
+        if any(value not in range(4) for value in [*responses.values(), difficulty]):
+            return jsonify({'success': False, 'error': 'Respuestas fuera de rango (0-3)'}), 400
 
         # Calcular puntaje total
-        total_score = sum(int(data['responses'][f'q{i}']) for i in range(1, 10))
+        total_score = sum(responses.values())
         
         # Preparar datos para almacenamiento
         current_datetime = datetime.now()
@@ -492,7 +1654,7 @@ def submit_phq9():
     'timestamp': current_datetime.isoformat(),
     'date': current_datetime.strftime('%d/%m/%Y'),
     'time': current_datetime.strftime('%H:%M:%S'),
-    'responses': data['responses'],
+    'responses': responses,
     'difficulty': difficulty,
     'total_score': total_score,
     'measurement_number': measurement_number
@@ -512,8 +1674,21 @@ def submit_phq9():
         return jsonify({'success': False, 'error': 'Error interno del servidor'}), 500
 
 @app.route("/admin", methods=["GET"])
+@admission_controlled('admin_dashboard')
 def admin_dashboard():
-    data = get_all_phq9_responses()
+    # Rango opcional ?desde=YYYY-MM-DD&hasta=YYYY-MM-DD; sin rango solo se leen los datos
+    # calientes y los archivos mensuales no se adjuntan
+    date_from = request.args.get('desde') or None
+    date_to = request.args.get('hasta') or None
+    for value in (date_from, date_to):
+        if value:
+            try:
+                datetime.strptime(value, '%Y-%m-%d')
+            except ValueError:
+                return jsonify({'success': False, 'error': 'Fecha inválida (YYYY-MM-DD)'}), 400
+
+    with_archives = bool(date_from or date_to)
+    data = get_all_phq9_responses(date_from, date_to, replica=True, archives=with_archives)
 
     html = """
 <!DOCTYPE html>
@@ -534,7 +1709,16 @@ th { background-color: #f2f2f2; }
 <body>
 
 <h2>Dashboard Clínico – PHQ-9</h2>
+"""
 
+    if not with_archives:
+        html += f"""
+<p style="font-size:14px; color:#555;">
+Mostrando solo respuestas recientes (no archivadas; retención de {HOT_RETENTION_DAYS} días). Use ?desde=AAAA-MM-DD&amp;hasta=AAAA-MM-DD para consultar el archivo histórico.
+</p>
+"""
+
+    html += """
 <table>
 <tr>
     <th>Fecha / Hora</th>
@@ -571,18 +1755,38 @@ Uso clínico exclusivo. Información confidencial.
 """
     return render_template_string(html)
 
+@app.route('/admin/analitica', methods=['GET'])
+@admission_controlled('admin_dashboard')
+def admin_analytics():
+    """Resumen poblacional calculado sobre la instantánea analítica"""
+    snapshot = load_analytics_snapshot()
+    if snapshot is None:
+        response = jsonify({'success': False, 'error': 'Instantánea analítica no disponible o desactualizada'})
+        response.status_code = 503
+        response.headers['Retry-After'] = str(int(ANALYTICS_SNAPSHOT_MINUTES * 60) or ADMISSION_RETRY_AFTER)
+        return response
+    return jsonify(snapshot.population_summary())
+
 @app.route('/api/health', methods=['GET'])
 def health_check():
     """Endpoint de verificación de salud del sistema"""
+    age = replica_age() if READ_REPLICA_ENABLED else None
     return jsonify({
         'status': 'healthy',
         'timestamp': datetime.now().isoformat(),
-        'database': 'connected' if os.path.exists(DB_PATH) else 'not_found'
+        'database': 'connected' if os.path.exists(DB_PATH) else 'not_found',
+        'last_backup': load_last_backup_report(),
+        'admission': admission.snapshot(),
+        'read_replica': {
+            'enabled': READ_REPLICA_ENABLED,
+            'age_s': round(age, 1) if age is not None else None
+        }
     })
 
 if __name__ == '__main__':
     # Inicializar base de datos
     init_database()
+    start_background_jobs()
     
     # Verificar configuración de correo
     if not EMAIL_USER or not EMAIL_PASS:
@@ -0,0 +1,36 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# El módulo crea la base de datos (ruta relativa) al importarse: se importa desde un
+# directorio temporal para no tocar phq9_clinical.db del repositorio
+os.chdir(tempfile.mkdtemp(prefix='phq9_tests_'))
+# Perfilado activo solo para peticiones con el token de pruebas
+os.environ.update(PROFILING_ENABLED='1', PROFILING_SECRET='secreto-de-pruebas', PROFILING_SAMPLE_RATE='0')
+PROFILING_TOKEN = {'X-Profile-Token': 'secreto-de-pruebas'}
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import phq9_backend  # noqa: E402
+
+
+@pytest.fixture
+def backend(tmp_path, monkeypatch):
+    """Módulo del backend con una base de datos nueva en un directorio temporal"""
+    monkeypatch.chdir(tmp_path)
+    phq9_backend.init_database()
+    return phq9_backend
+
+
+@pytest.fixture
+def client(backend):
+    return backend.app.test_client()
+
+
+def submit(client, email, value=1, difficulty=1):
+    return client.post('/api/submit-phq9', json={
+        'email': email,
+        'responses': {f'q{i}': value for i in range(1, 10)},
+        'difficulty': difficulty,
+    })
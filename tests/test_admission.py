@@ -0,0 +1,104 @@
+import threading
+import time
+
+import pytest
+
+from conftest import submit
+
+
+@pytest.fixture
+def saturated(backend, client, monkeypatch):
+    """Controlador pequeño (2 huecos; admin: 1 en ejecución y 1 en cola; envíos: 2 en cola)
+    con vistas que se bloquean hasta que la prueba libera un turno"""
+    controller = backend.AdmissionController(2, {
+        'submit_phq9': {'priority': 0, 'limit': 2, 'queue': 2, 'timeout': 5},
+        'admin_dashboard': {'priority': 1, 'limit': 1, 'queue': 1, 'timeout': 5},
+    })
+    monkeypatch.setattr(backend, 'admission', controller)
+
+    admitted = []
+    turns = threading.Semaphore(0)
+
+    def blocking(label):
+        def view(*args, **kwargs):
+            admitted.append(label)
+            turns.acquire()
+            return []
+        return view
+
+    monkeypatch.setattr(backend, 'save_phq9_response', blocking('submit'))
+    monkeypatch.setattr(backend, 'get_all_phq9_responses', blocking('admin'))
+
+    threads = []
+    responses = {}
+
+    def start(name, request):
+        thread = threading.Thread(target=lambda: responses.setdefault(name, request()))
+        thread.start()
+        threads.append(thread)
+
+    yield controller, admitted, turns, start, responses
+
+    for _ in range(10):
+        turns.release()
+    for thread in threads:
+        thread.join(5)
+
+
+def _wait_for(condition):
+    deadline = time.monotonic() + 5
+    while not condition():
+        assert time.monotonic() < deadline, 'timeout esperando el estado del controlador'
+        time.sleep(0.01)
+
+
+def _waiting(controller, route):
+    return controller.snapshot()['routes'][route]['waiting']
+
+
+def test_submissions_take_priority_over_queued_admin_reads(saturated, client):
+    controller, admitted, turns, start, responses = saturated
+
+    start('s1', lambda: submit(client, 's1@example.com'))
+    start('s2', lambda: submit(client, 's2@example.com'))
+    _wait_for(lambda: len(admitted) == 2)
+
+    # El admin llega primero a la cola, el envío después
+    start('a1', lambda: client.get('/admin'))
+    _wait_for(lambda: _waiting(controller, 'admin_dashboard') == 1)
+    start('s3', lambda: submit(client, 's3@example.com'))
+    _wait_for(lambda: _waiting(controller, 'submit_phq9') == 1)
+
+    turns.release()  # se libera un hueco
+    _wait_for(lambda: len(admitted) == 3)
+    assert admitted[2] == 'submit'
+
+    turns.release()
+    _wait_for(lambda: len(admitted) == 4)
+    assert admitted[3] == 'admin'
+
+
+def test_full_queues_are_shed_with_503(backend, saturated, client):
+    controller, admitted, turns, start, responses = saturated
+
+    start('s1', lambda: submit(client, 's1@example.com'))
+    start('s2', lambda: submit(client, 's2@example.com'))
+    _wait_for(lambda: len(admitted) == 2)
+    start('a1', lambda: client.get('/admin'))
+    start('s3', lambda: submit(client, 's3@example.com'))
+    start('s4', lambda: submit(client, 's4@example.com'))
+    _wait_for(lambda: _waiting(controller, 'submit_phq9') == 2
+              and _waiting(controller, 'admin_dashboard') == 1)
+
+    started = time.monotonic()
+    admin = client.get('/admin')
+    patient = submit(client, 's5@example.com')
+    assert time.monotonic() - started < 1
+
+    for response in (admin, patient):
+        assert response.status_code == 503
+        assert response.headers['Retry-After'] == str(backend.ADMISSION_RETRY_AFTER)
+
+    stats = controller.snapshot()['routes']
+    assert stats['admin_dashboard']['shed_queue_full'] == 1
+    assert stats['submit_phq9']['shed_queue_full'] == 1
@@ -0,0 +1,104 @@
+import os
+import sqlite3
+import subprocess
+import sys
+import threading
+
+from conftest import submit
+
+
+def test_out_of_range_answers_are_rejected(client):
+    assert submit(client, 'a@example.com', value=-1).status_code == 400
+    assert submit(client, 'a@example.com', value=4).status_code == 400
+    assert submit(client, 'a@example.com', difficulty=7).status_code == 400
+    assert client.post('/api/submit-phq9', json={'email': 'a@example.com', 'responses': {}}).status_code == 400
+
+
+def test_packed_column_matches_answers(backend, client, monkeypatch):
+    monkeypatch.setattr(backend, 'PACKED_ANSWERS', True)
+    backend.init_database()
+    client.post('/api/submit-phq9', json={
+        'email': 'a@example.com',
+        'responses': {f'q{i}': i % 4 for i in range(1, 10)},
+        'difficulty': 2,
+    })
+
+    conn = sqlite3.connect(backend.DB_PATH)
+    packed = conn.execute("SELECT answers_packed FROM phq9_responses").fetchone()[0]
+    conn.close()
+
+    expected = {f'q{i}': i % 4 for i in range(1, 10)}
+    expected['difficulty'] = 2
+    assert backend.unpack_answers(packed) == expected
+
+
+def test_snapshot_skips_invalid_legacy_rows(backend, client):
+    submit(client, 'a@example.com', value=2)
+    conn = sqlite3.connect(backend.DB_PATH)
+    conn.execute('''
+        INSERT INTO phq9_responses (patient_email, timestamp, measurement_number,
+            q1, q2, q3, q4, q5, q6, q7, q8, q9, difficulty, total_score)
+        VALUES ('legado@example.com', '2026-01-01T00:00:00', 1, -1, 0, 0, 0, 0, 0, 0, 0, 0, 0, -1)
+    ''')
+    # Puntaje mayor que 27: cabe en el registro (u1) pero no en el histograma de 28 valores
+    conn.execute('''
+        INSERT INTO phq9_responses (patient_email, timestamp, measurement_number,
+            q1, q2, q3, q4, q5, q6, q7, q8, q9, difficulty, total_score)
+        VALUES ('legado@example.com', '2026-01-02T00:00:00', 2, 9, 9, 9, 9, 0, 0, 0, 0, 0, 0, 36)
+    ''')
+    conn.commit()
+    conn.close()
+
+    assert backend.refresh_analytics_snapshot() == 1
+    summary = client.get('/admin/analitica').get_json()
+    assert summary['responses'] == 1
+    assert summary['item_positive']['q9'] == 1
+    assert summary['severity']['moderadamente_severa'] == 1
+
+
+def test_snapshot_is_never_built_in_request_and_has_max_age(backend, client, monkeypatch):
+    submit(client, 'a@example.com')
+    assert client.get('/admin/analitica').status_code == 503
+    assert not os.path.exists(backend.ANALYTICS_SNAPSHOT_PATH)
+
+    backend.refresh_analytics_snapshot()
+    assert client.get('/admin/analitica').status_code == 200
+
+    monkeypatch.setattr(backend, 'ANALYTICS_SNAPSHOT_MAX_AGE_MINUTES', 0)
+    assert client.get('/admin/analitica').status_code == 503
+
+
+def test_concurrent_snapshot_refreshes_do_not_collide(backend, client, tmp_path):
+    for i in range(20):
+        submit(client, f'p{i}@example.com')
+
+    errors = []
+
+    def refresh():
+        try:
+            backend.refresh_analytics_snapshot()
+        except Exception as e:  # pragma: no cover - solo en caso de fallo
+            errors.append(e)
+
+    threads = [threading.Thread(target=refresh) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert len(backend.AnalyticsSnapshot()) == 20
+    assert not list(tmp_path.glob('*.parcial'))
+
+
+def test_import_does_not_start_background_jobs(tmp_path):
+    # Un `flask ...` de corta duración importa el módulo: no debe lanzar la instantánea
+    env = dict(os.environ, ANALYTICS_SNAPSHOT_MINUTES='1',
+               PYTHONPATH=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    subprocess.run(
+        [sys.executable, '-c', 'import time, phq9_backend; time.sleep(0.5)'],
+        cwd=tmp_path, env=env, check=True, stderr=subprocess.DEVNULL,
+    )
+
+    assert not (tmp_path / 'phq9_snapshot.bin').exists()
+    assert not list(tmp_path.glob('*.parcial'))
@@ -0,0 +1,50 @@
+import sqlite3
+from datetime import datetime, timedelta
+
+from conftest import submit
+
+
+def _age_first_response(backend, days):
+    conn = sqlite3.connect(backend.DB_PATH)
+    old = (datetime.now() - timedelta(days=days)).isoformat()
+    conn.execute("UPDATE phq9_responses SET timestamp = ? WHERE id = 1", (old,))
+    conn.commit()
+    conn.close()
+    return old
+
+
+def test_archive_keeps_measurement_numbering(backend, client):
+    submit(client, 'a@example.com')
+    submit(client, 'a@example.com', value=2)
+    _age_first_response(backend, backend.HOT_RETENTION_DAYS + 30)
+
+    moved = backend.archive_old_responses()
+
+    assert sum(moved.values()) == 1
+    assert backend.get_measurement_number('a@example.com') == 3
+    assert backend.get_previous_score('a@example.com') == 18
+    assert len(backend.get_all_phq9_responses()) == 2
+
+
+def test_dashboard_without_range_skips_archives(backend, client, monkeypatch):
+    submit(client, 'a@example.com')
+    submit(client, 'a@example.com')
+    old = _age_first_response(backend, backend.HOT_RETENTION_DAYS + 30)
+    backend.archive_old_responses()
+
+    attached = []
+    original = backend.list_archive_files
+    monkeypatch.setattr(backend, 'list_archive_files', lambda *a: attached.append(a) or original(*a))
+
+    assert client.get('/admin').status_code == 200
+    assert attached == []
+
+    response = client.get(f'/admin?desde={old[:10]}&hasta={old[:10]}')
+    assert response.status_code == 200
+    assert attached
+    assert 'a@example.com' in response.get_data(as_text=True)
+
+
+def test_dashboard_rejects_impossible_dates(client):
+    assert client.get('/admin?hasta=2024-02-31').status_code == 400
+    assert client.get('/admin?desde=ayer').status_code == 400
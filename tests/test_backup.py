@@ -0,0 +1,100 @@
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import threading
+
+from conftest import submit
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _count(path):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute("SELECT COUNT(*) FROM phq9_responses").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_incremental_backup_restores_latest_state(backend, client, tmp_path):
+    submit(client, 'a@example.com')
+    full = backend.backup_database()
+    submit(client, 'b@example.com')
+    delta = backend.backup_database(incremental=True)
+
+    assert full['type'] == 'completo'
+    assert delta['type'] == 'incremental'
+    assert delta['pages_written'] < delta['pages_total']
+
+    backend.verify_backup(delta['file'])
+    restored = backend.restore_backup(delta['file'], str(tmp_path / 'restaurada.db'))
+    assert _count(restored) == 2
+
+
+def test_backup_report_is_shared_between_processes(backend, client, tmp_path):
+    for i in range(20):
+        submit(client, f'p{i}@example.com')
+
+    # `flask backup` en otro proceso mientras este proceso (el "worker") sigue escribiendo
+    env = dict(os.environ, PYTHONPATH=REPO_DIR, BACKUP_PAGES_PER_STEP='1', BACKUP_STEP_SLEEP='0.05')
+    child = subprocess.Popen(
+        [sys.executable, '-c', 'import json, phq9_backend; print(json.dumps(phq9_backend.backup_database()))'],
+        cwd=tmp_path, env=env, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True,
+    )
+    while child.poll() is None:
+        submit(client, 'concurrente@example.com')
+    report = json.loads(child.stdout.read())
+
+    assert child.returncode == 0
+    assert report['writes_during'] > 0
+    assert report['write_latency_ms_during'] is not None
+    assert client.get('/api/health').get_json()['last_backup']['file'] == report['file']
+
+
+def test_latency_is_not_recorded_without_backups(backend, client):
+    submit(client, 'a@example.com')
+    assert not os.path.exists(backend.BACKUP_DIR)
+
+
+def test_rollback_backup_finishes_under_steady_writes(backend, client, monkeypatch):
+    for i in range(20):
+        submit(client, f'p{i}@example.com')
+    monkeypatch.setattr(backend, 'BACKUP_PAGES_PER_STEP', 1)
+    monkeypatch.setattr(backend, 'BACKUP_STEP_SLEEP', 0.02)
+    monkeypatch.setattr(backend, 'BACKUP_MAX_RESTARTS', 2)
+
+    stop = threading.Event()
+
+    def writer():
+        conn = sqlite3.connect(backend.DB_PATH)
+        while not stop.is_set():
+            conn.execute("INSERT INTO patient_summary VALUES (hex(randomblob(8)), 1, 0, '')")
+            conn.commit()
+            stop.wait(0.005)
+        conn.close()
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    try:
+        report = backend.backup_database()
+    finally:
+        stop.set()
+        thread.join()
+
+    assert report['restarts'] > backend.BACKUP_MAX_RESTARTS
+    assert report['single_step_fallback'] is True
+    backend.verify_backup(report['file'])
+
+
+def test_periodic_job_retries_lock(backend, tmp_path):
+    lock_path = str(tmp_path / 'tarea.lock')
+    holder = backend._try_lock(lock_path)
+    ran = threading.Event()
+
+    backend.start_periodic_job('prueba', 0.02, ran.set, lock_path)
+    assert not ran.wait(0.2)
+
+    holder.close()  # el proceso que tenía el bloqueo termina
+    assert ran.wait(2)
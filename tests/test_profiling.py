@@ -0,0 +1,69 @@
+import os
+import pstats
+
+from conftest import PROFILING_TOKEN
+
+
+def test_valid_token_writes_pstats(backend, client):
+    response = client.get('/admin', headers=PROFILING_TOKEN)
+
+    name = response.headers['X-Profile-File']
+    assert name.endswith('.pstats')
+    path = os.path.join(backend.PROFILING_DIR, name)
+    assert pstats.Stats(path).total_calls > 0
+
+
+def test_wrong_or_missing_token_is_not_profiled(backend, client):
+    for headers in ({'X-Profile-Token': 'incorrecto'}, {}):
+        response = client.get('/admin', headers=headers)
+        assert 'X-Profile-File' not in response.headers
+    assert backend._list_profiles() == []
+
+
+def test_unselected_endpoint_is_not_profiled(backend, client):
+    response = client.get('/api/health', headers=PROFILING_TOKEN)
+    assert 'X-Profile-File' not in response.headers
+
+
+def test_sampling_mode_writes_folded_stacks(backend, client, monkeypatch):
+    monkeypatch.setattr(backend, 'PROFILING_MODE', 'sampling')
+    response = client.get('/admin', headers=PROFILING_TOKEN)
+
+    name = response.headers['X-Profile-File']
+    assert name.endswith('.folded')
+    assert os.path.exists(os.path.join(backend.PROFILING_DIR, name))
+
+
+def test_rotation_keeps_newest_profiles(backend, client, monkeypatch):
+    monkeypatch.setattr(backend, 'PROFILING_MAX_FILES', 2)
+    names = [client.get('/admin', headers=PROFILING_TOKEN).headers['X-Profile-File'] for _ in range(3)]
+
+    assert backend._list_profiles() == sorted(names[1:], reverse=True)
+
+
+def test_list_and_download_require_token(backend, client):
+    name = client.get('/admin', headers=PROFILING_TOKEN).headers['X-Profile-File']
+
+    assert client.get('/admin/perfiles').status_code == 403
+    assert client.get(f'/admin/perfiles/{name}').status_code == 403
+
+    listing = client.get('/admin/perfiles', headers=PROFILING_TOKEN).get_json()
+    assert [entry['name'] for entry in listing['profiles']] == [name]
+
+    download = client.get(f'/admin/perfiles/{name}', headers=PROFILING_TOKEN)
+    assert download.status_code == 200
+    assert len(download.data) == listing['profiles'][0]['bytes']
+
+
+def test_download_outside_listing_is_404(backend, client):
+    open('otro.pstats', 'w').close()
+    client.get('/admin', headers=PROFILING_TOKEN)
+
+    assert client.get('/admin/perfiles/..%2Fotro.pstats', headers=PROFILING_TOKEN).status_code == 404
+    assert client.get('/admin/perfiles/phq9_clinical.db', headers=PROFILING_TOKEN).status_code == 404
+
+
+def test_endpoints_refuse_when_no_secret_configured(backend, client, monkeypatch):
+    monkeypatch.setattr(backend, 'PROFILING_SECRET', '')
+    assert client.get('/admin/perfiles').status_code == 403
+    assert client.get('/admin/perfiles', headers={'X-Profile-Token': ''}).status_code == 403
@@ -0,0 +1,89 @@
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from conftest import submit
+
+
+@pytest.fixture
+def replica_backend(backend, monkeypatch):
+    """Configuración por defecto (DB_WAL_MODE desactivado) con la réplica habilitada"""
+    monkeypatch.setattr(backend, 'DB_WAL_MODE', False)
+    monkeypatch.setattr(backend, 'READ_REPLICA_ENABLED', True)
+    backend.init_database()
+    return backend
+
+
+def test_replica_serves_reads_within_staleness_bound(replica_backend, client, monkeypatch):
+    backend = replica_backend
+    submit(client, 'a@example.com')
+    assert backend.read_db_path() == backend.DB_PATH  # todavía no existe
+
+    backend.refresh_read_replica()
+    submit(client, 'b@example.com')
+
+    assert backend.read_db_path() == backend.READ_REPLICA_PATH
+    assert len(backend.get_all_phq9_responses(replica=True)) == 1
+    assert len(backend.get_all_phq9_responses()) == 2
+
+    monkeypatch.setattr(backend, 'READ_REPLICA_MAX_STALENESS', 0)
+    assert backend.read_db_path() == backend.DB_PATH
+
+
+def test_replica_refresh_is_not_throttled(replica_backend, client, monkeypatch):
+    backend = replica_backend
+    for i in range(50):
+        submit(client, f'p{i}@example.com')
+    monkeypatch.setattr(backend, 'BACKUP_PAGES_PER_STEP', 1)
+    monkeypatch.setattr(backend, 'BACKUP_STEP_SLEEP', 5)
+
+    started = time.monotonic()
+    copy = backend.refresh_read_replica()
+
+    assert time.monotonic() - started < 2
+    assert copy['steps'] == 1
+    conn = sqlite3.connect(backend.READ_REPLICA_PATH)
+    assert conn.execute("SELECT COUNT(*) FROM phq9_responses").fetchone()[0] == 50
+    conn.close()
+
+
+def test_periodic_job_can_run_at_startup(backend, tmp_path):
+    ran = threading.Event()
+    backend.start_periodic_job('arranque', 3600, ran.set, str(tmp_path / 'arranque.lock'),
+                               run_immediately=True)
+    assert ran.wait(2)
+
+
+def test_replica_refresh_requires_wal(backend):
+    with pytest.raises(RuntimeError):
+        backend.refresh_read_replica()
+
+
+def test_submit_is_not_blocked_during_replica_refresh(replica_backend, client, tmp_path):
+    backend = replica_backend
+    conn = sqlite3.connect(backend.DB_PATH)
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == 'wal'
+    # ~80 MB de relleno para que la copia dure lo suficiente como para solaparse
+    conn.execute("CREATE TABLE relleno (b BLOB)")
+    conn.execute('''
+        WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < 80)
+        INSERT INTO relleno SELECT randomblob(1000000) FROM n
+    ''')
+    conn.commit()
+    conn.close()
+
+    refresh = threading.Thread(target=backend.refresh_read_replica)
+    refresh.start()
+    deadline = time.monotonic() + 5
+    while not any(path.stat().st_size for path in tmp_path.glob('*.parcial')):
+        assert time.monotonic() < deadline and refresh.is_alive(), 'la copia no empezó'
+        time.sleep(0.001)
+
+    response = submit(client, 'durante@example.com')
+    copy_still_running = refresh.is_alive()
+    refresh.join()
+
+    assert response.status_code == 200
+    assert copy_still_running